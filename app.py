@@ -3,7 +3,12 @@ import pandas as pd
 from datetime import timedelta, date, datetime
 import calendar
 import io
+import json
+import re
+import threading
 import time
+import uuid
+import xlsxwriter
 import gspread
 from oauth2client.service_account import ServiceAccountCredentials
 
@@ -203,10 +208,15 @@ def get_metadata():
     return hotels, products
 
 # --- Hotel Data Loader ---
-def get_hotel_data(hotel_name):
+def get_hotel_data(hotel_name, with_log=False):
+    """스냅샷(DB_ 시트)에 아직 반영 안 된 변경 이벤트까지 적용한 현재 상태.
+    with_log=True면 (df, 최근 이벤트 목록, 반영 위치)를 반환"""
     client = connect_to_gsheet()
     sh = client.open("Mammam_DB")
     sheet_name = f"DB_{hotel_name}"
+    # 반영 위치를 스냅샷보다 먼저 읽음. compaction은 스냅샷을 쓴 뒤 반영 위치를 옮기므로
+    # 이 순서면 읽은 스냅샷은 항상 wm까지는 반영된 상태 (더 최신이면 이벤트를 한 번 더 적용할 뿐)
+    wm = get_log_watermark(sh, hotel_name)
     
     try:
         ws = sh.worksheet(sheet_name)
@@ -220,12 +230,17 @@ def get_hotel_data(hotel_name):
         ws = sh.add_worksheet(title=sheet_name, rows=1000, cols=10)
         ws.append_row(['날짜', '숙소명', '상품명', '요금', '재고', '판매상태'])
         df = pd.DataFrame(columns=['날짜', '숙소명', '상품명', '요금', '재고', '판매상태'])
-    return df
+
+    events = load_change_log(sh, hotel_name, wm)
+    df = apply_events(df, [e for e in events if e['행'] > wm], hotel_name)
+    return (df, events, wm) if with_log else df
 
 # --- Save Logic ---
 def save_metadata(type, data):
     client = connect_to_gsheet()
     sh = client.open("Mammam_DB")
+    # 검색 인덱스 재생성 기준 (get_search_index)
+    st.session_state.meta_version = st.session_state.get('meta_version', 0) + 1
     
     if type == 'hotels':
         try: ws = sh.worksheet("hotels")
@@ -246,7 +261,7 @@ def save_metadata(type, data):
         else:
             ws.update([["hotel", "name", "code"]])
 
-def save_hotel_data(hotel_name, df):
+def save_hotel_data(hotel_name, df, product_names=None):
     client = connect_to_gsheet()
     sh = client.open("Mammam_DB")
     sheet_name = f"DB_{hotel_name}"
@@ -254,20 +269,320 @@ def save_hotel_data(hotel_name, df):
     try: ws = sh.worksheet(sheet_name)
     except: ws = sh.add_worksheet(sheet_name, 1000, 10)
     
-    ws.clear()
     if not df.empty:
         save_df = df.copy()
         # 저장할 때는 표준 포맷 YYYY-MM-DD
         save_df['날짜'] = save_df['날짜'].astype(str)
         update_data = [save_df.columns.values.tolist()] + save_df.values.tolist()
-        ws.update(update_data)
     else:
-        ws.update([['날짜', '숙소명', '상품명', '요금', '재고', '판매상태']])
+        update_data = [['날짜', '숙소명', '상품명', '요금', '재고', '판매상태']]
+
+    # clear() 후 다시 쓰면 중간에 실패하거나 다른 세션이 읽을 때 빈 시트가 보이므로,
+    # 한 번의 update로 덮어쓰고 기존보다 짧아진 아래쪽은 빈 칸으로 채움
+    width = len(update_data[0])
+    update_data += [[""] * width for _ in range(len(ws.col_values(1)) - len(update_data))]
+    ws.update(values=update_data, range_name=f"A1:{gspread.utils.rowcol_to_a1(len(update_data), width)}")
+
+    # 저장된 숙소분만 운영현황 요약에 반영 (다른 숙소는 다시 읽지 않음)
+    if product_names is None:
+        product_names = [p['name'] for p in st.session_state.get('products', []) if p['hotel'] == hotel_name]
+    update_summary(hotel_name, df, product_names)
+
+# --- Change Log (변경 이벤트 누적 기록) ---
+# 저장은 LOG_{숙소} 시트에 변경분만 한 줄씩 추가(append)하고,
+# DB_{숙소} 스냅샷 반영(compaction)은 미반영분이 쌓였을 때 백그라운드에서 처리.
+# 이전* 값이 비어 있으면 신규 행, 요금/재고/판매상태가 모두 비어 있으면 삭제
+LOG_COLS = ['시각', '작업ID', '작업', '작업자', '날짜', '상품명', '이전요금', '이전재고', '이전판매상태', '요금', '재고', '판매상태']
+LOG_STATE_SHEET = "log_state"
+COMPACT_EVERY = 300  # 미반영 이벤트가 이만큼 쌓이면 스냅샷에 반영
+UNDO_KEEP = 500      # 이미 반영된 이벤트 중 되돌리기용으로 같이 읽는 개수
+
+def log_cell(v):
+    """로그 비교/저장용 값 정규화: NaN -> "", "50,000" / 50000.0 -> 50000"""
+    if isinstance(v, str):
+        try: v = float(v.strip().replace(",", ""))
+        except ValueError: return v.strip()
+    if v is None or pd.isna(v): return ""
+    v = float(v)
+    return int(v) if v.is_integer() else v
+
+def diff_events(old_df, new_df, action):
+    """두 상태를 (날짜, 상품명) 기준으로 비교해 바뀐 행만 이벤트로 변환"""
+    keys, vals = ['날짜', '상품명'], ['요금', '재고', '판매상태']
+    frames = []
+    for d in (old_df, new_df):
+        d = d[keys + vals].copy()
+        d['날짜'] = d['날짜'].astype(str)
+        d['상품명'] = d['상품명'].astype(str)
+        for c in vals: d[c] = d[c].map(log_cell)
+        frames.append(d)
+
+    # outer merge로 생긴 NaN / float 승격을 다시 정규화한 뒤 비교
+    m = frames[0].merge(frames[1], on=keys, how='outer', suffixes=('_old', ''))
+    changed = pd.Series(False, index=m.index)
+    for c in vals:
+        m[c] = m[c].map(log_cell).astype(object)
+        m[f"{c}_old"] = m[f"{c}_old"].map(log_cell).astype(object)
+        changed |= m[f"{c}_old"] != m[c]
+    m = m[changed].sort_values(keys)
+
+    now = get_kst_now()
+    base = {
+        '시각': now.strftime("%Y-%m-%d %H:%M:%S"),
+        '작업ID': f"{now:%Y%m%d%H%M%S}-{uuid.uuid4().hex[:6]}",
+        '작업': action,
+        '작업자': st.session_state.get('operator') or "미입력",
+    }
+    return [{
+        **base, '날짜': r['날짜'], '상품명': r['상품명'],
+        '이전요금': r['요금_old'], '이전재고': r['재고_old'], '이전판매상태': r['판매상태_old'],
+        '요금': r['요금'], '재고': r['재고'], '판매상태': r['판매상태'],
+    } for r in m.to_dict('records')]
+
+def apply_events(df, events, hotel_name):
+    """이벤트를 순서대로 적용 (같은 키는 마지막 이벤트가 최종 상태)"""
+    if not events: return df
+    ev = pd.DataFrame(events).drop_duplicates(['날짜', '상품명'], keep='last')
+    ev['날짜'] = pd.to_datetime(ev['날짜']).dt.date
+
+    out = df.copy()
+    if not out.empty:
+        out['날짜'] = pd.to_datetime(out['날짜']).dt.date
+        touched = pd.MultiIndex.from_frame(out[['날짜', '상품명']]).isin(list(zip(ev['날짜'], ev['상품명'])))
+        out = out[~touched]
+
+    ups = ev[(ev['요금'] != "") | (ev['재고'] != "") | (ev['판매상태'] != "")].copy()
+    for c in ['요금', '재고']: ups[c] = ups[c].map(log_cell)
+    ups['숙소명'] = hotel_name
+    out = pd.concat([out, ups[['날짜', '숙소명', '상품명', '요금', '재고', '판매상태']]], ignore_index=True)
+    return out.sort_values(['날짜', '상품명']).reset_index(drop=True)
+
+def revert_events(df, events, from_row, hotel_name):
+    """from_row 이후 이벤트를 최신부터 역순으로 되돌린 상태 (시트 재조회 없음)"""
+    inverse = []
+    for e in reversed([e for e in events if e['행'] >= from_row]):
+        inverse.append({**e, '요금': e['이전요금'], '재고': e['이전재고'], '판매상태': e['이전판매상태']})
+    return apply_events(df, inverse, hotel_name)
+
+def get_log_watermark(sh, hotel_name):
+    """스냅샷에 반영된 마지막 로그 행 번호 (1 = 헤더만, 반영분 없음)"""
+    try: rows = sh.worksheet(LOG_STATE_SHEET).get_all_values()
+    except: return 1
+    for r in rows[1:]:
+        if r and r[0] == hotel_name: return int(r[1])
+    return 1
+
+def set_log_watermark(hotel_name, row):
+    """log_state 시트에서 해당 숙소 행 1줄만 덮어씀 (다른 숙소 반영 작업과 겹쳐도 서로 지우지 않음)"""
+    client = connect_to_gsheet()
+    sh = client.open("Mammam_DB")
+    try: ws = sh.worksheet(LOG_STATE_SHEET)
+    except gspread.WorksheetNotFound:
+        ws = sh.add_worksheet(LOG_STATE_SHEET, 100, 2)
+        ws.append_row(["숙소명", "반영행"])
+
+    names = ws.col_values(1)
+    if hotel_name in names[1:]:
+        r = names.index(hotel_name, 1) + 1
+        ws.update(values=[[hotel_name, row]], range_name=f"A{r}:B{r}")
+    else:
+        ws.append_row([hotel_name, row])
+
+def read_log_rows(ws, start):
+    """LOG_ 시트의 start행부터 끝까지를 범위로 읽어 이벤트로 변환 (각 이벤트에 시트 행 번호 '행')"""
+    events = []
+    for i, r in enumerate(ws.get(f"A{start}:L")):
+        if not any(r): continue
+        e = dict(zip(LOG_COLS, list(r) + [""] * (len(LOG_COLS) - len(r))))
+        e['행'] = start + i
+        events.append(e)
+    return events
+
+def load_change_log(sh, hotel_name, wm):
+    """미반영 이벤트 전체 + 반영된 최근 UNDO_KEEP개만 범위로 읽음. wm: 호출 쪽에서 먼저 읽은 반영 위치"""
+    try: ws = sh.worksheet(f"LOG_{hotel_name}")
+    except gspread.WorksheetNotFound: return []
+
+    start = max(2, wm + 1 - UNDO_KEEP)
+    events = read_log_rows(ws, start)
+
+    # 범위 첫 작업은 앞부분이 잘렸을 수 있음 -> 반영된 작업이면 되돌리기 대상에서 제외
+    if start > 2 and events and events[0]['행'] <= wm:
+        first = events[0]['작업ID']
+        events = [e for e in events if e['작업ID'] != first or e['행'] > wm]
+    return events
+
+def sync_change_log(hotel_name):
+    """이 세션이 모르는 LOG_ 행(불러온 뒤 다른 작업자가 기록한 것)만 범위로 읽어
+    main_df / change_log에 반영. 반환값: 새로 읽은 이벤트"""
+    logs = st.session_state.change_log
+    known = {e['행'] for e in logs}
+    # 불러올 때 읽은 행은 처음 행부터 끊김 없이 이어지므로 첫 빈 번호부터 읽으면 됨
+    start = min(known) if known else st.session_state.log_watermark + 1
+    while start in known: start += 1
+
+    client = connect_to_gsheet()
+    try: ws = client.open("Mammam_DB").worksheet(f"LOG_{hotel_name}")
+    except gspread.WorksheetNotFound: return []
+    newer = [e for e in read_log_rows(ws, start) if e['행'] not in known]
+    if newer:
+        st.session_state.main_df = apply_events(st.session_state.main_df, newer, hotel_name)
+        st.session_state.change_log = sorted(logs + newer, key=lambda e: e['행'])
+    return newer
+
+def append_change_log(hotel_name, events):
+    """이벤트를 LOG_ 시트 끝에 추가하고 각 이벤트에 시트 행 번호('행')를 기록"""
+    client = connect_to_gsheet()
+    sh = client.open("Mammam_DB")
+    sheet_name = f"LOG_{hotel_name}"
+
+    try: ws = sh.worksheet(sheet_name)
+    except gspread.WorksheetNotFound:
+        ws = sh.add_worksheet(sheet_name, 1000, len(LOG_COLS))
+        ws.append_row(LOG_COLS)
+
+    res = ws.append_rows([[e[c] for c in LOG_COLS] for e in events])
+    start = int(re.search(r"![A-Z]+(\d+)", res['updates']['updatedRange']).group(1))
+    for i, e in enumerate(events): e['행'] = start + i
+
+@st.cache_resource
+def get_background_jobs():
+    """세션 간 공유 상태. 숙소별로 작업은 하나만 돌고, 도는 중에 들어온 요청은 queued에 합쳐 두었다가
+    끝난 직후 한 번 더 실행. errors/watermark는 각 숙소의 마지막 실패 내용과 반영 완료 위치"""
+    return {'lock': threading.Lock(), 'running': set(), 'queued': {}, 'errors': {}, 'watermark': {}}
+
+def compact_hotel_data(hotel_name, product_names):
+    """시트에서 스냅샷 + 미반영 이벤트를 새로 읽어 다시 저장하고 반영 위치를 기록.
+    세션이 들고 있는 df는 다른 작업자의 변경이 빠져 있을 수 있으므로 쓰지 않음.
+    반환값: 반영 위치 (미반영분이 COMPACT_EVERY 미만이면 요약만 갱신하고 시트의 현재 반영 위치)"""
+    df, events, wm = get_hotel_data(hotel_name, with_log=True)
+    pending = [e['행'] for e in events if e['행'] > wm]
+    if len(pending) < COMPACT_EVERY:
+        update_summary(hotel_name, df, product_names)
+        return wm
+
+    # 스냅샷을 먼저 쓰고 반영 위치는 나중에 옮김. 그 사이에 읽는 세션은 이미 반영된 이벤트를
+    # 한 번 더 적용하게 되지만, 이벤트는 최종 값이라 결과가 같음
+    upto = max(pending)
+    save_hotel_data(hotel_name, df, product_names)
+    set_log_watermark(hotel_name, upto)
+    return upto
+
+def run_in_background(hotel_name, product_names, compact=False):
+    """요약 갱신 (compact=True면 스냅샷 반영 여부도 확인). 둘 다 시트를 새로 읽어서 처리"""
+    jobs = get_background_jobs()
+    with jobs['lock']:
+        if hotel_name in jobs['running']:
+            prev = jobs['queued'].get(hotel_name)
+            jobs['queued'][hotel_name] = (product_names, compact or bool(prev and prev[1]))
+            return
+        jobs['running'].add(hotel_name)
+
+    def job(product_names, compact):
+        while True:
+            try:
+                if compact:
+                    upto = compact_hotel_data(hotel_name, product_names)
+                    with jobs['lock']:
+                        jobs['watermark'][hotel_name] = max(jobs['watermark'].get(hotel_name, 0), upto)
+                else:
+                    update_summary(hotel_name, get_hotel_data(hotel_name), product_names)
+                jobs['errors'].pop(hotel_name, None)
+            except Exception as e:
+                task = "스냅샷 반영" if compact else "운영현황 요약 갱신"
+                jobs['errors'][hotel_name] = f"{get_kst_now():%H:%M:%S} {task} 실패: {e}"
+
+            with jobs['lock']:
+                if hotel_name not in jobs['queued']:
+                    jobs['running'].discard(hotel_name)
+                    return
+                product_names, compact = jobs['queued'].pop(hotel_name)
+
+    threading.Thread(target=job, args=(product_names, compact), daemon=True).start()
+
+def commit_changes(hotel_name, old_df, new_df, action):
+    """변경분만 로그에 추가. 반환값: 기록된 이벤트 수"""
+    events = diff_events(old_df, new_df, action)
+    if not events: return 0
+    append_change_log(hotel_name, events)
+    st.session_state.change_log += events
+
+    # 반영 위치는 백그라운드 작업이 성공한 뒤에만 옮김 (실패하면 다음 저장 때 다시 요청)
+    done = get_background_jobs()['watermark'].get(hotel_name, 0)
+    st.session_state.log_watermark = max(st.session_state.log_watermark, done)
+    my_p = [p['name'] for p in st.session_state.products if p['hotel'] == hotel_name]
+    pending = sum(1 for e in st.session_state.change_log if e['행'] > st.session_state.log_watermark)
+    run_in_background(hotel_name, my_p, compact=pending >= COMPACT_EVERY)
+    return len(events)
+
+# --- Operations Summary (숙소 x 날짜 집계) ---
+# summary 시트는 숙소당 1행: [숙소명, 집계(JSON: [[날짜, 품절, 판매중지, 요금누락], ...]), 갱신시각]
+# 저장할 때 자기 숙소 행만 덮어쓰므로 다른 숙소 저장과 겹쳐도 서로 지우지 않음
+SUMMARY_SHEET = "summary"
+SUMMARY_SHEET_COLS = ['숙소명', '집계', '갱신시각']
+SUMMARY_COLS = ['숙소명', '날짜', '품절', '판매중지', '요금누락']
+
+def build_hotel_summary(hotel_name, df, product_names=None):
+    """숙소 1곳의 날짜별 품절/판매중지/요금누락 상품 수 (문제 있는 날짜만)"""
+    if df.empty: return []
+    work = df[['날짜', '상품명', '요금', '재고', '판매상태']].copy()
+    work['날짜'] = pd.to_datetime(work['날짜']).dt.date
+    work['품절'] = pd.to_numeric(work['재고'], errors='coerce').eq(0)
+    work['판매중지'] = work['판매상태'].eq('N')
+    work['요금누락'] = pd.to_numeric(work['요금'], errors='coerce').isna()
+    g = work.groupby('날짜')[['품절', '판매중지', '요금누락']].sum()
+
+    # 등록된 상품인데 해당 날짜에 행 자체가 없는 경우도 요금누락으로 집계
+    if product_names:
+        reg = set(product_names)
+        present = work[work['상품명'].isin(reg)].groupby('날짜')['상품명'].nunique()
+        g['요금누락'] += len(reg) - present.reindex(g.index, fill_value=0)
+
+    g = g[(g > 0).any(axis=1)]
+    return [[hotel_name, str(d), int(a), int(b), int(c)] for d, a, b, c in g.itertuples()]
+
+def update_summary(hotel_name, df=None, product_names=None):
+    """summary 시트에서 해당 숙소 행 1줄만 덮어씀 (오늘 이후 날짜만). df가 None이면 집계 비움"""
+    client = connect_to_gsheet()
+    sh = client.open("Mammam_DB")
+    try: ws = sh.worksheet(SUMMARY_SHEET)
+    except gspread.WorksheetNotFound:
+        ws = sh.add_worksheet(SUMMARY_SHEET, 1000, len(SUMMARY_SHEET_COLS))
+        ws.append_row(SUMMARY_SHEET_COLS)
+
+    today = str(date.today())
+    rows = build_hotel_summary(hotel_name, df, product_names) if df is not None else []
+    blob = json.dumps([r[1:] for r in rows if r[1] >= today])
+    row = [hotel_name, blob, get_kst_now().strftime("%Y-%m-%d %H:%M:%S")]
+
+    # A열(숙소명)만 읽어 자기 행 위치를 찾음. 없으면 맨 끝에 추가
+    names = ws.col_values(1)
+    if hotel_name in names[1:]:
+        r = names.index(hotel_name, 1) + 1
+        ws.update(values=[row], range_name=f"A{r}:C{r}")
+    else:
+        ws.append_row(row)
+
+def get_summary():
+    """대시보드용: 전체 숙소 집계를 한 번에 읽음"""
+    client = connect_to_gsheet()
+    try: rows = client.open("Mammam_DB").worksheet(SUMMARY_SHEET).get_all_values()
+    except: rows = []
+
+    out, seen = [], set()
+    for r in rows[1:]:
+        if len(r) < 2 or r[0] in seen: continue
+        seen.add(r[0])
+        out += [[r[0]] + item for item in json.loads(r[1] or "[]")]
+    df = pd.DataFrame(out, columns=SUMMARY_COLS)
+    df['날짜'] = pd.to_datetime(df['날짜']).dt.date
+    return df
 
 # --- Helpers ---
+KR_WEEKDAYS = ["(월)", "(화)", "(수)", "(목)", "(금)", "(토)", "(일)"]
+
 def get_kr_weekday(d):
-    days = ["(월)", "(화)", "(수)", "(목)", "(금)", "(토)", "(일)"]
-    return days[d.weekday()]
+    return KR_WEEKDAYS[d.weekday()]
 
 def format_date_kr(d):
     if isinstance(d, str):
@@ -309,6 +624,12 @@ def delete_product_item(hotel, idx):
     del curr[idx]
     st.session_state.products = others + curr
     save_metadata('products', st.session_state.products)
+    refresh_summary(hotel)
+
+def refresh_summary(hotel):
+    """상품이 추가/삭제되면 요금누락 집계도 달라지므로 숙소 요약 갱신 (시트를 새로 읽어 백그라운드 처리)"""
+    my_p = [p['name'] for p in st.session_state.products if p['hotel'] == hotel]
+    run_in_background(hotel, my_p)
 
 def update_download_log():
     # [요청] 한국 시간(KST)으로 기록
@@ -322,6 +643,224 @@ def toggle_all_days():
     for i in range(7):
         st.session_state[f"wd_{i}"] = val
 
+# --- Hotel Search Index (초성 / 로마자 / 상품코드) ---
+CHOSUNG = "ㄱㄲㄴㄷㄸㄹㅁㅂㅃㅅㅆㅇㅈㅉㅊㅋㅌㅍㅎ"
+ROMAN_INITIAL = ["g", "kk", "n", "d", "tt", "r", "m", "b", "pp", "s", "ss", "", "j", "jj", "ch", "k", "t", "p", "h"]
+ROMAN_MEDIAL = ["a", "ae", "ya", "yae", "eo", "e", "yeo", "ye", "o", "wa", "wae", "oe", "yo", "u", "wo", "we", "wi", "yu", "eu", "ui", "i"]
+ROMAN_FINAL = ["", "k", "k", "k", "n", "n", "n", "t", "l", "k", "m", "l", "l", "l", "p", "l", "m", "p", "p", "t", "t", "ng", "t", "t", "k", "t", "p", "t"]
+
+def normalize_search(text):
+    return "".join(str(text).lower().split())
+
+def to_chosung(text):
+    """'롯데 호텔' -> 'ㄹㄷㅎㅌ' (한글 음절만 초성으로 바꾸고 나머지는 그대로)"""
+    out = []
+    for ch in normalize_search(text):
+        code = ord(ch) - 0xAC00
+        out.append(CHOSUNG[code // 588] if 0 <= code < 11172 else ch)
+    return "".join(out)
+
+def to_roman(text):
+    """음절 단위 로마자 변환 (개정 로마자 기준, 음운 변화 미적용). r/l은 구분하지 않음"""
+    out = []
+    for ch in normalize_search(text):
+        code = ord(ch) - 0xAC00
+        if 0 <= code < 11172:
+            out.append(ROMAN_INITIAL[code // 588] + ROMAN_MEDIAL[code % 588 // 28] + ROMAN_FINAL[code % 28])
+        else:
+            out.append(ch)
+    return "".join(out).replace("r", "l")
+
+# 음절 변환(롯데 -> lotde)과 다르게 굳어진 브랜드 영문 표기
+BRAND_SPELLINGS = {
+    "롯데": "lotte", "신라": "shilla", "조선": "chosun", "하얏트": "hyatt", "힐튼": "hilton",
+    "메리어트": "marriott", "쉐라톤": "sheraton", "웨스틴": "westin", "인터컨티넨탈": "intercontinental",
+    "노보텔": "novotel", "이비스": "ibis", "라마다": "ramada", "켄싱턴": "kensington", "워커힐": "walkerhill",
+}
+
+def to_brand_roman(text):
+    """브랜드명만 관용 표기로 바꾼 로마자 ('롯데호텔' -> 'lottehotel'). 브랜드가 없으면 None"""
+    t = normalize_search(text)
+    hit = False
+    for ko, en in BRAND_SPELLINGS.items():
+        if ko in t:
+            t, hit = t.replace(ko, en), True
+    return to_roman(t) if hit else None
+
+def search_grams(text):
+    """1글자는 그대로, 2글자 이상은 2-gram 집합"""
+    if len(text) < 2: return {text} if text else set()
+    return {text[i:i+2] for i in range(len(text) - 1)}
+
+def build_search_index(hotels, products):
+    """숙소 검색 인덱스. hotels: 표시 순서의 숙소명 리스트, products: products 메타데이터"""
+    extra = {}
+    for p in products:
+        extra.setdefault(p['hotel'], []).extend([p['name'], str(p.get('code', ''))])
+
+    keys, grams = [], {}
+    for i, h in enumerate(hotels):
+        # (우선순위, 검색키): 숙소명 > 초성 > 로마자 > 상품명/코드
+        fields = [(0, normalize_search(h)), (1, to_chosung(h)), (2, to_roman(h))]
+        brand = to_brand_roman(h)
+        if brand: fields.append((2, brand))
+        fields += [(3, normalize_search(x)) for x in extra.get(h, []) if x]
+        keys.append(fields)
+        for _, k in fields:
+            for g in search_grams(k) | set(k):
+                grams.setdefault(g, set()).add(i)
+    return {'hotels': hotels, 'keys': keys, 'grams': grams, 'memo': {}}
+
+def get_search_index():
+    """세션별 검색 인덱스. 숙소/상품 목록을 저장할 때(meta_version 증가)만 다시 만듦"""
+    ver = st.session_state.get('meta_version', 0)
+    cached = st.session_state.get('search_index')
+    if cached is None or cached[0] != ver:
+        cached = (ver, build_search_index(st.session_state.hotels[::-1], st.session_state.products))
+        st.session_state.search_index = cached
+    return cached[1]
+
+def is_jamo(ch):
+    return '\u3131' <= ch <= '\u314e'
+
+def find_chosung(name_key, cho_key, q, cq):
+    """초성 키에서 cq 위치를 찾되, 검색어의 완성형 글자('롯ㄷ'의 '롯')는 이름의 같은 자리 글자와 같아야 일치"""
+    pos = cho_key.find(cq)
+    while pos >= 0:
+        if all(ch == name_key[pos + j] for j, ch in enumerate(q) if not is_jamo(ch)): return pos
+        pos = cho_key.find(cq, pos + 1)
+    return -1
+
+def search_hotels(index, query):
+    """검색어와 맞는 숙소를 관련도 순으로 반환 (같은 점수면 목록 순서 유지)"""
+    q = normalize_search(query)
+    if not q: return list(index['hotels'])
+    # 검색창 값은 rerun마다 그대로 남아 있으므로 같은 검색어는 결과 재사용 (인덱스가 세션별이라 memo도 세션별)
+    memo = index['memo']
+    if q in memo: return memo[q]
+
+    variants = {q}
+    # 영문이 들어간 검색어만 로마자 비교 (한글 검색어를 로마자로 바꾸면 '아' -> 'a'처럼 엉뚱한 숙소가 걸림)
+    if re.search(r"[a-z]", q): variants.add(to_roman(q))
+    # 'ㄹㄷ', '롯ㄷ'처럼 자음이 섞인 경우만 초성 비교 (완성형만 입력하면 오탐 방지)
+    cq = to_chosung(q) if any(is_jamo(ch) for ch in q) else None
+    if cq: variants.add(cq)
+
+    cands = set()
+    for v in variants:
+        sets = sorted((index['grams'].get(g, set()) for g in search_grams(v)), key=len)
+        if sets and sets[0]: cands |= set.intersection(*sets)
+
+    # 점수 = 우선순위*3 + (0 정확히 일치 / 1 앞부분 / 2 포함). 필드가 우선순위 순이라 첫 일치 단계에서 멈춤
+    ranked = []
+    for i in cands:
+        best, hit_tier = 99, None
+        for tier, key in index['keys'][i]:
+            if hit_tier is not None and tier != hit_tier: break
+            for v in variants:
+                if v == cq and v != q:
+                    # 완성형이 섞인 초성 검색어는 초성 키에서만, 완성형 글자까지 맞는지 확인
+                    pos = find_chosung(index['keys'][i][0][1], key, q, cq) if tier == 1 else -1
+                else:
+                    pos = key.find(v)
+                if pos < 0: continue
+                hit_tier = tier
+                best = min(best, tier * 3 + (0 if key == v else 1 if pos == 0 else 2))
+        if hit_tier is not None: ranked.append((best, i))
+    ranked.sort()
+
+    result = [index['hotels'][i] for _, i in ranked]
+    if len(memo) > 256: memo.clear()
+    memo[q] = result
+    return result
+
+# --- Export Templates (채널별 엑셀 양식) ---
+# columns: (헤더, 원본필드) 순서대로 출력. 원본필드가 None이면 빈 칸
+# 원본필드: '날짜', '숙소명', '상품명', '상품코드', '요금', '재고', '판매상태'
+# date_format: 'kr' = "2025-01-03 (금)", 그 외는 strftime 포맷
+# status_map: 판매상태 Y/N 치환 (없으면 그대로)
+EXPORT_TEMPLATES = {
+    "기본 (13열)": {
+        'columns': [
+            ("날짜(A)", '날짜'), ("상품명(B)", '상품명'), ("C", None), ("D", None), ("E", None), ("F", None),
+            ("요금(G)", '요금'), ("H", None), ("재고(I)", '재고'), ("상품코드(J)", '상품코드'),
+            ("K", None), ("L", None), ("판매상태(M)", '판매상태'),
+        ],
+        'date_format': 'kr',
+        'status_map': {},
+    },
+    "통합 (숙소명 포함)": {
+        'columns': [
+            ("숙소명", '숙소명'), ("날짜", '날짜'), ("상품코드", '상품코드'), ("상품명", '상품명'),
+            ("요금", '요금'), ("재고", '재고'), ("판매여부", '판매상태'),
+        ],
+        'date_format': '%Y-%m-%d',
+        'status_map': {'Y': 1, 'N': 0},
+    },
+}
+
+def apply_export_template(df, code_map, template):
+    """호텔 데이터(df)를 양식 컬럼 구성으로 변환 (행 단위 루프 없이 컬럼 단위 처리)"""
+    src = df.reset_index(drop=True)
+    dt = pd.to_datetime(src['날짜'])
+    if template['date_format'] == 'kr':
+        date_col = dt.dt.strftime('%Y-%m-%d') + ' ' + dt.dt.weekday.map(dict(enumerate(KR_WEEKDAYS)))
+    else:
+        date_col = dt.dt.strftime(template['date_format'])
+
+    names = src['상품명'].astype(object)
+    fields = {
+        '날짜': date_col,
+        '숙소명': src['숙소명'],
+        '상품명': names,
+        '상품코드': names.map(code_map),
+        '요금': src['요금'],
+        '재고': src['재고'],
+        '판매상태': src['판매상태'].replace(template['status_map']) if template['status_map'] else src['판매상태'],
+    }
+    out = pd.DataFrame({h: (fields[f] if f else "") for h, f in template['columns']}, index=src.index)
+    return out.astype(object).where(out.notna(), "")
+
+def write_export(frames, template, fmt):
+    """양식 변환된 DataFrame들을 순서대로 흘려 쓰기 (xlsx: constant_memory, csv: 청크 단위)"""
+    headers = [h for h, _ in template['columns']]
+    output = io.BytesIO()
+
+    if fmt == 'csv':
+        # 엑셀에서 한글이 깨지지 않도록 BOM 포함
+        output.write(pd.DataFrame(columns=headers).to_csv(index=False).encode('utf-8-sig'))
+        for frame in frames:
+            output.write(frame.to_csv(index=False, header=False).encode('utf-8'))
+    else:
+        wb = xlsxwriter.Workbook(output, {'constant_memory': True})
+        ws = wb.add_worksheet('Sheet1')
+        ws.write_row(0, 0, headers)
+        r = 1
+        for frame in frames:
+            for row in frame.itertuples(index=False, name=None):
+                ws.write_row(r, 0, row)
+                r += 1
+        wb.close()
+
+    output.seek(0)
+    return output
+
+def iter_all_hotel_exports(template, hotels, products):
+    """전체 숙소를 한 곳씩 읽어 변환 (한 번에 한 숙소 분량만 메모리에 유지)"""
+    for h in hotels:
+        df = get_hotel_data(h)
+        if df.empty: continue
+        order = [p['name'] for p in products if p['hotel'] == h]
+        code_map = {p['name']: p.get('code', '') for p in products if p['hotel'] == h}
+        if order:
+            df['상품명'] = pd.Categorical(df['상품명'], order, ordered=True)
+        yield apply_export_template(df.sort_values(['날짜', '상품명']), code_map, template)
+
+EXPORT_MIME = {
+    'xlsx': "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    'csv': "text/csv",
+}
+
 # --- Initialization ---
 if 'init' not in st.session_state:
     with st.spinner("데이터 로딩 중..."):
@@ -347,13 +886,17 @@ if 'init' not in st.session_state:
 # ==========================================
 with st.sidebar:
     st.title("맘맘 요금재고 관리툴") 
+    st.text_input("작업자", key="operator", placeholder="이름 (변경 이력에 기록)")
     
     st.markdown("### 🔍 숙소 검색")
     search_q = st.text_input("search_hotel", placeholder="검색어 입력 후 엔터", label_visibility="collapsed")
-    st.caption("검색어 입력 후 아래 목록에서 선택")
+    st.caption("검색어 입력 후 아래 목록에서 선택 (초성 ㄹㄷ / 영문 / 상품코드 가능). 영문은 음절 발음(lotde)과 주요 브랜드 표기(lotte, shilla)만 인식")
     
     sorted_hotels = st.session_state.hotels[::-1]
-    filtered_hotels = [h for h in sorted_hotels if search_q in h] if search_q else sorted_hotels
+    if search_q:
+        filtered_hotels = search_hotels(get_search_index(), search_q)
+    else:
+        filtered_hotels = sorted_hotels
     
     current_hotel = None
     if filtered_hotels:
@@ -365,7 +908,7 @@ with st.sidebar:
             current_hotel = selected_option
             if 'last_hotel' not in st.session_state or st.session_state.last_hotel != current_hotel:
                 with st.spinner(f"'{current_hotel}' 데이터 로딩 중..."):
-                    st.session_state.main_df = get_hotel_data(current_hotel)
+                    st.session_state.main_df, st.session_state.change_log, st.session_state.log_watermark = get_hotel_data(current_hotel, with_log=True)
                     st.session_state.last_hotel = current_hotel
                     st.session_state.save_message = ""
     else:
@@ -407,6 +950,7 @@ with st.sidebar:
                     st.session_state.products = [p for p in st.session_state.products if p['hotel'] != current_hotel]
                     save_metadata('hotels', st.session_state.hotels)
                     save_metadata('products', st.session_state.products)
+                    update_summary(current_hotel)
                     st.session_state.confirm_delete_req = False
                     st.session_state.pop('last_hotel', None)
                     st.success("삭제되었습니다.")
@@ -420,6 +964,9 @@ with st.sidebar:
 # ==========================================
 if current_hotel:
     st.header(f"🏨 {current_hotel} 관리")
+    job_error = get_background_jobs()['errors'].get(current_hotel)
+    if job_error:
+        st.warning(f"⚠️ 백그라운드 작업 오류 ({job_error}) - 입력한 변경 이력은 저장되어 있으며 다음 저장 때 다시 시도합니다.")
     tab1, tab2, tab3 = st.tabs(["1. 📦 상품 세팅", "2. 📅 가격/재고 등록", "3. 📤 엑셀 추출"])
 
     # TAB 1: Product Setting
@@ -437,6 +984,7 @@ if current_hotel:
                             'hotel': current_hotel, 'name': new_p, 'code': new_c
                         })
                         save_metadata('products', st.session_state.products)
+                        refresh_summary(current_hotel)
                         st.success("완료")
                         time.sleep(0.5)
                         st.rerun()
@@ -569,12 +1117,13 @@ if current_hotel:
                                     })
                             
                             new_df = pd.DataFrame(new_rows)
+                            old_df = st.session_state.main_df
                             st.session_state.main_df = pd.concat([st.session_state.main_df, new_df], ignore_index=True)
                             st.session_state.main_df['날짜'] = pd.to_datetime(st.session_state.main_df['날짜']).dt.date
                             st.session_state.main_df.drop_duplicates(subset=['날짜','숙소명','상품명'], keep='last', inplace=True)
                             st.session_state.main_df.sort_values(['날짜','상품명'], inplace=True)
                             
-                            save_hotel_data(current_hotel, st.session_state.main_df)
+                            commit_changes(current_hotel, old_df, st.session_state.main_df, "입력")
                             st.session_state.selected_dates_buffer = [] 
                             st.session_state.input_reset_key += 1
                             st.success("저장 완료")
@@ -633,8 +1182,9 @@ if current_hotel:
                     target_cols = ['요금', '재고', '판매상태']
                     
                     if not edited[target_cols].equals(show_df[target_cols]):
+                        old_df = st.session_state.main_df.copy()
                         st.session_state.main_df.loc[edited.index, target_cols] = edited[target_cols]
-                        save_hotel_data(current_hotel, st.session_state.main_df)
+                        commit_changes(current_hotel, old_df, st.session_state.main_df, "수정")
                         st.session_state.save_message = "✅ 모든 수정사항이 저장되었습니다!"
                         time.sleep(0.1)
                         st.rerun()
@@ -717,6 +1267,41 @@ if current_hotel:
             html += "</tbody></table>"
             st.markdown(html, unsafe_allow_html=True)
 
+        # 변경 이력 / 되돌리기 (LOG_ 시트에서 읽어둔 이벤트 사용. 되돌릴 때만 이후 기록된 행을 범위로 확인)
+        st.divider()
+        with st.expander("🕘 변경 이력 / 되돌리기"):
+            if st.session_state.get('undo_warning'):
+                st.warning(st.session_state.pop('undo_warning'))
+            logs = st.session_state.get('change_log', [])
+            if not logs:
+                st.info("변경 이력이 없습니다.")
+            else:
+                batches = pd.DataFrame(logs).groupby('작업ID', sort=False).agg(
+                    시작행=('행', 'min'), 시각=('시각', 'first'), 작업=('작업', 'first'),
+                    작업자=('작업자', 'first'), 건수=('행', 'size'),
+                ).sort_values('시작행', ascending=False).head(20)
+                st.dataframe(batches[['시각', '작업', '작업자', '건수']], use_container_width=True, hide_index=True)
+
+                labels = {r.시작행: f"{r.시각} | {r.작업} | {r.작업자} | {r.건수}건" for r in batches.itertuples()}
+                undo_from = st.selectbox("되돌릴 작업 (선택한 작업과 그 이후 작업이 모두 취소됩니다)", list(labels), format_func=labels.get, key="undo_pick")
+                if st.button("↩️ 선택한 작업 이전 상태로 되돌리기", key="undo_btn"):
+                    # 불러온 뒤 다른 작업자가 기록한 변경을 먼저 반영하고, 되돌릴 날짜/상품과 겹치면 중단
+                    newer = sync_change_log(current_hotel)
+                    undo_keys = {(e['날짜'], e['상품명']) for e in logs if e['행'] >= undo_from}
+                    clash = [e for e in newer if (e['날짜'], e['상품명']) in undo_keys]
+                    if clash:
+                        who = ", ".join(sorted({e['작업자'] for e in clash}))
+                        st.session_state.undo_warning = (
+                            f"⚠️ 되돌리려는 날짜/상품 {len(clash)}건을 그 사이 다른 작업({who})이 수정했습니다. "
+                            "최신 상태를 불러왔으니 확인 후 다시 선택하세요."
+                        )
+                        st.rerun()
+                    reverted = revert_events(st.session_state.main_df, logs, undo_from, current_hotel)
+                    n = commit_changes(current_hotel, st.session_state.main_df, reverted, "되돌리기")
+                    st.session_state.main_df = reverted
+                    st.session_state.save_message = f"↩️ {n}건을 되돌렸습니다." if n else "변경 사항이 없습니다."
+                    st.rerun()
+
     # TAB 3: Excel
     with tab3:
         st.subheader("엑셀 다운로드")
@@ -726,26 +1311,30 @@ if current_hotel:
             now_str = get_kst_now().strftime("%Y-%m-%d %H:%M:%S")
             st.info(f"📊 현재 **{len(show_df)}**개의 데이터가 준비되었습니다. (업데이트: {now_str})")
             
-            out_rows = []
-            for _, r in show_df.iterrows():
-                # [요청] 엑셀 J열 매핑
-                row = [""]*13
-                row[0] = format_date_kr(r['날짜'])
-                row[1] = r['상품명']
-                row[6] = r['요금']
-                row[8] = r['재고']
-                row[9] = code_map.get(r['상품명'], '') # J열
-                row[12] = r['판매상태']
-                out_rows.append(row)
-            
-            df_ex = pd.DataFrame(out_rows, columns=["날짜(A)", "상품명(B)", "C", "D", "E", "F", "요금(G)", "H", "재고(I)", "상품코드(J)", "K", "L", "판매상태(M)"])
-            output = io.BytesIO()
-            with pd.ExcelWriter(output, engine='xlsxwriter') as w: df_ex.to_excel(w, index=False, sheet_name='Sheet1')
-            output.seek(0)
-            
-            if st.download_button("📥 엑셀 파일 다운로드 (.xlsx)", output, f"[{current_hotel}]_{date.today()}.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", type="primary", on_click=update_download_log):
+            c_tpl, c_fmt = st.columns([2, 1])
+            tpl_name = c_tpl.selectbox("추출 양식", list(EXPORT_TEMPLATES.keys()), key="export_tpl")
+            fmt = c_fmt.radio("파일 형식", ["xlsx", "csv"], horizontal=True, key="export_fmt")
+            tpl = EXPORT_TEMPLATES[tpl_name]
+
+            # rerun마다 만들지 않고 다운로드 버튼을 누를 때만 파일 생성 (지금 화면의 df/양식을 인자로 고정)
+            if st.download_button(
+                f"📥 엑셀 파일 다운로드 (.{fmt})",
+                lambda df=show_df, cm=code_map, tpl=tpl, fmt=fmt: write_export([apply_export_template(df, cm, tpl)], tpl, fmt).getvalue(),
+                f"[{current_hotel}]_{date.today()}.{fmt}", EXPORT_MIME[fmt], type="primary", on_click=update_download_log,
+            ):
                 pass
-            
+
+            with st.expander("🏨 전체 숙소 통합 추출"):
+                st.caption("선택한 양식으로 모든 숙소를 하나의 파일로 만듭니다. (다운로드를 누를 때 숙소 수만큼 시트를 읽습니다)")
+                # 파일은 버튼을 누를 때 만들어 바로 내려보내고 세션에는 남기지 않음
+                # (콜백은 스크립트 밖에서 실행되므로 숙소/상품 목록은 지금 값을 넘김)
+                all_hotels, all_products = list(st.session_state.hotels), list(st.session_state.products)
+                st.download_button(
+                    f"📥 통합 파일 다운로드 ({tpl_name}, .{fmt})",
+                    lambda: write_export(iter_all_hotel_exports(tpl, all_hotels, all_products), tpl, fmt).getvalue(),
+                    f"[전체숙소]_{date.today()}.{fmt}", EXPORT_MIME[fmt], key="export_all_dl", on_click=update_download_log,
+                )
+
             if st.session_state.download_logs:
                 st.write("📜 다운로드 기록 (최신순)")
                 for log in st.session_state.download_logs:
@@ -753,3 +1342,43 @@ if current_hotel:
 
 else:
     st.info("👈 왼쪽에서 숙소를 선택하거나 새로 추가해주세요.")
+
+    # ==========================================
+    # 운영 현황 대시보드 (summary 시트 1회 조회)
+    # ==========================================
+    st.header("📋 숙소별 운영 현황")
+    for h, err in list(get_background_jobs()['errors'].items()):
+        st.warning(f"⚠️ {h}: {err}")
+    sum_df = get_summary()
+    sum_df = sum_df[sum_df['날짜'] >= date.today()] if not sum_df.empty else sum_df
+
+    if sum_df.empty:
+        st.success("예정된 품절/판매중지/요금누락 날짜가 없습니다.")
+    else:
+        m1, m2, m3 = st.columns(3)
+        m1.metric("품절", int(sum_df['품절'].sum()))
+        m2.metric("판매중지", int(sum_df['판매중지'].sum()))
+        m3.metric("요금누락", int(sum_df['요금누락'].sum()))
+
+        by_hotel = sum_df.groupby('숙소명').agg(
+            날짜수=('날짜', 'nunique'), 가장빠른날짜=('날짜', 'min'),
+            품절=('품절', 'sum'), 판매중지=('판매중지', 'sum'), 요금누락=('요금누락', 'sum'),
+        ).sort_values('가장빠른날짜')
+        st.markdown("##### 🏨 숙소별 합계")
+        st.dataframe(by_hotel, use_container_width=True)
+
+        st.markdown("##### 📅 날짜별 상세")
+        detail = sum_df.sort_values(['날짜', '숙소명']).copy()
+        detail['날짜'] = detail['날짜'].apply(format_date_kr)
+        st.dataframe(detail[SUMMARY_COLS], use_container_width=True, hide_index=True)
+
+    with st.expander("🔄 요약 전체 재집계"):
+        st.caption("요약은 저장할 때마다 자동 반영됩니다. 기존 데이터를 처음 반영할 때만 사용하세요. (숙소 수만큼 시트를 읽습니다)")
+        if st.button("전체 숙소 재집계", key="rebuild_summary_btn"):
+            with st.spinner("재집계 중..."):
+                for h in st.session_state.hotels:
+                    my_p = [p['name'] for p in st.session_state.products if p['hotel'] == h]
+                    update_summary(h, get_hotel_data(h), my_p)
+            st.success("재집계 완료")
+            time.sleep(0.5)
+            st.rerun()
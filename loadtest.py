@@ -0,0 +1,366 @@
+"""
+맘맘 요금재고 관리툴 부하 테스트
+
+Streamlit AppTest로 app.py 세션을 동시에 여러 개 띄우고, 메모리 상의 가짜
+Google Sheets 백엔드 위에서 운영자 동작(숙소 선택 -> 달력 넘기기 -> 일괄 입력
+-> 리스트 수정 -> 다운로드)을 재생합니다. 동시 세션 수를 늘려가며
+rerun 지연시간(p50/p95), 세션 상태 크기, 프로세스 메모리 증가량, 백엔드 호출 수를 출력합니다.
+
+    python loadtest.py
+    python loadtest.py --sessions 1 5 10 20 --hotels 300 --latency 0.05
+
+측정상의 한계:
+- AppTest는 실행할 때마다 st.secrets / Runtime 전역값을 바꿔 끼우므로 한 프로세스
+  안에서 스레드로 동시에 돌릴 수 없습니다. 세션마다 프로세스를 하나씩 띄우고 시트
+  데이터만 부모 프로세스의 공유 저장소(multiprocessing manager)를 같이 씁니다.
+  실제 서버는 한 프로세스 안에서 세션들이 GIL을 나눠 쓰므로, 여기 지연시간에는
+  그 경합이 빠져 있습니다 (코어 수보다 세션이 많을 때의 CPU 경합만 반영).
+- 세션당 메모리는 state MB(시나리오 후 st.session_state 값의 크기, DataFrame은
+  memory_usage(deep=True))로 봅니다. 서버에서 세션마다 따로 들고 있는 몫입니다.
+  RSS+MB는 세션을 돌린 프로세스 1개의 최대 RSS 증가량이라 AppTest / streamlit 자체
+  할당이 대부분이고 세션 수와 거의 무관합니다. 참고용으로만 같이 출력합니다.
+- calls/s는 전체 세션의 시나리오 실행 구간(첫 세션 시작 ~ 마지막 세션 종료) 기준입니다.
+  프로세스 생성 / import 시간은 빠집니다.
+- p50/p95에는 첫 실행(load, import/캐시 준비 포함)을 넣지 않습니다. --steps로 따로 확인.
+- AppTest는 st.data_editor 입력을 지원하지 않아, 리스트 수정 단계에서는
+  data_editor 반환값의 요금 몇 칸을 바꿔 실제 저장 경로를 타게 합니다.
+- download_button 클릭도 지원하지 않아, 다운로드는 형식 변경(파일 재생성)으로 대신합니다.
+"""
+import argparse
+import logging
+import multiprocessing as mp
+import random
+import re
+import resource
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+from multiprocessing.managers import BaseManager
+from unittest import mock
+
+APP_FILE = "app.py"
+HEADER = ['날짜', '숙소명', '상품명', '요금', '재고', '판매상태']
+_real_sleep = time.sleep
+
+# ==========================================
+# Fake Sheets Backend
+# ==========================================
+class SheetStore:
+    """Mammam_DB 시트 내용 + API 호출 수 (부모 프로세스에 1개만 존재)"""
+
+    def __init__(self):
+        self.sheets = {}
+        self.calls = Counter()
+        self.lock = threading.Lock()
+
+    def rows(self, title):
+        # Sheets API처럼 끝부분의 빈 행은 돌려주지 않음
+        rows = self.sheets[title]
+        n = len(rows)
+        while n and not any(rows[n - 1]): n -= 1
+        return [list(r) for r in rows[:n]]
+
+    def call(self, op, title=None, arg=None):
+        with self.lock:
+            self.calls[op] += 1
+            if op == 'worksheet': return title in self.sheets
+            if op == 'add_worksheet': self.sheets.setdefault(title, [])
+            elif op in ('get_all_values', 'get_all_records'): return self.rows(title)
+            elif op == 'append_row': self.sheets[title].append(list(arg))
+            elif op == 'append_rows':
+                self.sheets[title].extend(list(r) for r in arg)
+                return len(self.sheets[title]) - len(arg) + 1
+            elif op == 'get': return self.rows(title)[arg - 1:]
+            elif op == 'col_values':
+                col = [r[arg - 1] if len(r) >= arg else "" for r in self.sheets[title]]
+                while col and not col[-1]: col.pop()
+                return col
+            elif op == 'clear': self.sheets[title] = []
+            elif op == 'update': self.sheets[title] = [list(r) for r in arg]
+            elif op == 'update_range':
+                # 같은 열 범위의 행 단위 덮어쓰기만 지원 ("A{행}:..." )
+                start, values = arg
+                rows = self.sheets[title]
+                rows.extend([] for _ in range(start - 1 + len(values) - len(rows)))
+                for i, r in enumerate(values): rows[start - 1 + i] = list(r)
+
+    def load(self, sheets):
+        self.sheets.update(sheets)
+
+    def stats(self):
+        with self.lock:
+            return dict(self.calls)
+
+
+class StoreManager(BaseManager):
+    pass
+
+StoreManager.register('SheetStore', SheetStore)
+
+
+class FakeClient:
+    """gspread.Client / Spreadsheet 흉내. 호출마다 --latency 만큼 대기"""
+
+    def __init__(self, store, latency):
+        self.store = store
+        self.latency = latency
+
+    def call(self, op, title=None, arg=None):
+        if self.latency: _real_sleep(self.latency)
+        return self.store.call(op, title, arg)
+
+    def open(self, name):
+        self.call('open')
+        return self
+
+    def worksheet(self, title):
+        import gspread
+        if not self.call('worksheet', title): raise gspread.WorksheetNotFound(title)
+        return FakeWorksheet(self, title)
+
+    def add_worksheet(self, title, rows=None, cols=None):
+        self.call('add_worksheet', title)
+        return FakeWorksheet(self, title)
+
+
+class FakeWorksheet:
+    def __init__(self, client, title):
+        self.client = client
+        self.title = title
+
+    def get_all_values(self):
+        return self.client.call('get_all_values', self.title)
+
+    def get_all_records(self):
+        values = self.client.call('get_all_records', self.title)
+        if len(values) < 2: return []
+        return [dict(zip(values[0], r)) for r in values[1:]]
+
+    def append_row(self, row):
+        self.client.call('append_row', self.title, row)
+
+    def append_rows(self, rows):
+        start = self.client.call('append_rows', self.title, rows)
+        return {'updates': {'updatedRange': f"'{self.title}'!A{start}:L{start + len(rows) - 1}"}}
+
+    def get(self, range_name):
+        # "A{행}:L" 형태만 지원 (app.py의 변경 로그 조회)
+        return self.client.call('get', self.title, int(range_name.split(":")[0][1:]))
+
+    def col_values(self, col):
+        return self.client.call('col_values', self.title, col)
+
+    def clear(self):
+        self.client.call('clear', self.title)
+
+    def update(self, values=None, range_name=None):
+        if range_name is None: return self.client.call('update', self.title, values)
+        start = int(re.match(r"[A-Z]+(\d+)", range_name).group(1))
+        self.client.call('update_range', self.title, (start, values))
+
+
+def build_sheets(n_hotels, n_products, n_days):
+    """숙소/상품 메타데이터와 숙소별 요금 시트 생성"""
+    hotels = [f"테스트호텔{i:04d}" for i in range(n_hotels)]
+    sheets = {
+        'hotels': [["숙소명"]] + [[h] for h in hotels],
+        'products': [["hotel", "name", "code"]] + [[h, f"객실{j}", f"C{i:04d}{j}"] for i, h in enumerate(hotels) for j in range(n_products)],
+    }
+    start = date.today()
+    for h in hotels:
+        rows = [HEADER]
+        for d in range(n_days):
+            for j in range(n_products):
+                rows.append([str(start + timedelta(days=d)), h, f"객실{j}", random.randrange(50, 300) * 1000, random.randint(0, 5), random.choice("YYYN")])
+        sheets[f"DB_{h}"] = rows
+    return hotels, sheets
+
+
+# ==========================================
+# Operator Session
+# ==========================================
+def find(widgets, label):
+    return next(w for w in widgets if w.label == label)
+
+# 리스트 수정 단계에서만 켜짐 (세션마다 프로세스가 따로라 전역이어도 안전)
+EDIT_LIST = {'on': False}
+
+def editing_data_editor(orig):
+    """st.data_editor 대체: 원래대로 그린 뒤, 수정 단계면 앞 3행 요금을 +1000 해서 반환"""
+    def data_editor(data, *args, **kwargs):
+        out = orig(data, *args, **kwargs)
+        if EDIT_LIST['on'] and len(out):
+            out = out.copy()
+            rows = out.index[:3]
+            out.loc[rows, '요금'] = [(v if isinstance(v, (int, float)) and v == v else 0) + 1000 for v in out.loc[rows, '요금']]
+        return out
+    return data_editor
+
+def rss_mb():
+    """프로세스 최대 RSS (ru_maxrss: 리눅스는 KB, macOS는 byte)"""
+    r = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return r / 1024 / 1024 if sys.platform == "darwin" else r / 1024
+
+def deep_size(obj, seen=None):
+    """session_state 값 크기(byte). DataFrame은 memory_usage(deep=True), 컨테이너는 내용까지 합산"""
+    import pandas as pd
+    seen = set() if seen is None else seen
+    if id(obj) in seen: return 0
+    seen.add(id(obj))
+    if isinstance(obj, pd.DataFrame): return int(obj.memory_usage(deep=True).sum())
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(k, seen) + deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(deep_size(v, seen) for v in obj)
+    return size
+
+def state_mb(at):
+    """세션 1개가 st.session_state에 들고 있는 값의 크기 (key가 있는 위젯 값 포함)"""
+    return deep_size(dict(at.session_state.items())) / 1024 / 1024
+
+def run_scenario(at, hotel, rounds):
+    """운영자 1명의 동작을 재생하고 단계별 rerun 시간(초)을 반환"""
+    timings = []
+
+    def step(name, widget):
+        t0 = time.perf_counter()
+        widget.run()
+        timings.append((name, time.perf_counter() - t0))
+        if at.exception: raise RuntimeError(f"{name}: {at.exception[0].message}")
+
+    step('load', at)
+    step('select_hotel', at.sidebar.selectbox[0].set_value(hotel))
+
+    for _ in range(rounds):
+        # 달력 넘기기
+        step('calendar_view', find(at.radio, "보기 선택").set_value("🗓️ 요금 달력"))
+        step('calendar_next', find(at.button, "▶️").click())
+        step('calendar_prev', find(at.button, "◀️").click())
+
+        # 일괄 입력 (기간 추가 -> 요금 입력 -> 저장)
+        d0 = date.today() + timedelta(days=random.randint(0, 20))
+        step('bulk_dates', at.date_input(key="date_picker").set_value((d0, d0 + timedelta(days=6))))
+        step('bulk_add_period', at.button(key="add_pd_btn").click())
+        for w in at.number_input:
+            if w.key and w.key.startswith("pr_"): w.set_value(random.randrange(50, 300) * 1000)
+        step('bulk_save', find(at.button, "💾 데이터 입력하기 (저장)").click())
+
+        # 리스트 보기 -> 수정사항 저장
+        step('list_view', find(at.radio, "보기 선택").set_value("📋 리스트 보기 (직접 수정 가능)"))
+        EDIT_LIST['on'] = True
+        try: step('list_submit', find(at.button, "✅ 수정사항 한 번에 저장하기 (클릭)").click())
+        finally: EDIT_LIST['on'] = False
+
+        # 다운로드 (AppTest는 download_button 클릭을 지원하지 않으므로 형식 변경으로 파일 재생성)
+        step('download_csv', at.radio(key="export_fmt").set_value("csv"))
+        step('download_xlsx', at.radio(key="export_fmt").set_value("xlsx"))
+    return timings
+
+def session_worker(store, barrier, hotel, seed, args):
+    """세션 1개 = 프로세스 1개. (단계별 시간, 시나리오 시작/종료 시각, session_state MB, 프로세스 최대 RSS 증가량 MB) 반환"""
+    import gspread
+    import streamlit
+    from oauth2client.service_account import ServiceAccountCredentials
+    from streamlit.testing.v1 import AppTest
+
+    random.seed(seed)
+    logging.disable(logging.WARNING)  # 세션마다 반복되는 streamlit 경고 로그 억제
+    client = FakeClient(store, args.latency)
+
+    # app.py의 저장 후 안내 대기(0.1~1초)만 건너뜀. 짧은 sleep은 streamlit 내부 동작이므로 유지
+    ui_sleep = (lambda s: None if s >= 0.1 else _real_sleep(s)) if args.no_ui_sleep else _real_sleep
+
+    with mock.patch.object(gspread, "authorize", lambda creds: client), \
+         mock.patch.object(ServiceAccountCredentials, "from_json_keyfile_dict", lambda *a, **k: None), \
+         mock.patch("time.sleep", ui_sleep), \
+         mock.patch.object(streamlit, "data_editor", editing_data_editor(streamlit.data_editor)):
+        # 준비 중 하나라도 실패하면 barrier를 깨서 나머지 세션이 무한 대기하지 않게 함
+        try:
+            at = AppTest.from_file(APP_FILE, default_timeout=args.timeout)
+            at.secrets["passwords"] = {"access_code": "loadtest"}
+            at.secrets["gcp_service_account"] = {}
+            at.session_state["password_correct"] = True
+            base = rss_mb()
+            barrier.wait(timeout=args.timeout)
+        except Exception:
+            barrier.abort()
+            raise
+        started = time.time()
+        timings = run_scenario(at, hotel, args.rounds)
+        finished = time.time()
+
+    return timings, (started, finished), state_mb(at), rss_mb() - base
+
+
+# ==========================================
+# Runner
+# ==========================================
+def pct(xs, p):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(round(p / 100 * (len(xs) - 1))))]
+
+def run_level(manager, store, hotels, n_sessions, args):
+    barrier = manager.Barrier(n_sessions)
+    calls_before = sum(store.stats().values())
+    jobs = [(store, barrier, random.choice(hotels), random.random(), args) for _ in range(n_sessions)]
+
+    with mp.get_context("spawn").Pool(n_sessions) as pool:
+        results = pool.starmap(session_worker, jobs)
+    calls = sum(store.stats().values()) - calls_before
+    # 프로세스 생성 / import 시간을 빼고 시나리오가 실제로 돈 구간만
+    span = max(end for _, (_, end), _, _ in results) - min(start for _, (start, _), _, _ in results)
+
+    # 첫 실행(load)은 import/캐시 준비가 섞인 콜드 스타트라 분위수에서 제외
+    lat = [t for timings, _, _, _ in results for name, t in timings if name != 'load']
+    by_step = {}
+    for timings, _, _, _ in results:
+        for name, t in timings: by_step.setdefault(name, []).append(t)
+    state = [s for _, _, s, _ in results]
+    mem = [m for _, _, _, m in results]
+
+    return {
+        'sessions': n_sessions, 'reruns': len(lat), 'span': span,
+        'p50': pct(lat, 50), 'p95': pct(lat, 95),
+        'state_mb': sum(state) / len(state), 'mem_mb': sum(mem) / len(mem),
+        'calls': calls, 'calls_per_s': calls / span,
+        'by_step': {k: (pct(v, 50), pct(v, 95)) for k, v in by_step.items()},
+    }
+
+def main():
+    ap = argparse.ArgumentParser(description="app.py 동시 세션 부하 테스트")
+    ap.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 5, 10], help="동시 세션 수 단계")
+    ap.add_argument("--rounds", type=int, default=2, help="세션당 시나리오 반복 횟수")
+    ap.add_argument("--hotels", type=int, default=50)
+    ap.add_argument("--products", type=int, default=5, help="숙소당 상품 수")
+    ap.add_argument("--days", type=int, default=90, help="숙소당 요금 등록 일수")
+    ap.add_argument("--latency", type=float, default=0.0, help="가짜 시트 API 호출당 지연(초)")
+    ap.add_argument("--timeout", type=float, default=120, help="rerun 1회 제한시간(초)")
+    ap.add_argument("--steps", action="store_true", help="단계별 p50/p95 출력")
+    ap.add_argument("--no-ui-sleep", action="store_true", help="저장 후 time.sleep(0.1~1초) 대기 제외")
+    args = ap.parse_args()
+
+    random.seed(0)
+    hotels, sheets = build_sheets(args.hotels, args.products, args.days)
+
+    with StoreManager() as sm, mp.Manager() as manager:
+        store = sm.SheetStore()
+        store.load(sheets)
+        del sheets
+
+        print(f"hotels={args.hotels} products={args.products} days={args.days} latency={args.latency}s")
+        print("p50/p95: load 제외 rerun 지연 / state MB: 세션당 session_state 크기 (평균) / "
+              "RSS+MB: 세션 프로세스 1개의 최대 RSS 증가량 (참고용) / calls/s: 시나리오 구간 기준")
+        print(f"{'sessions':>8} {'reruns':>7} {'p50(ms)':>9} {'p95(ms)':>9} {'state MB':>9} {'RSS+MB':>8} {'calls':>7} {'calls/s':>8}")
+        for n in args.sessions:
+            r = run_level(manager, store, hotels, n, args)
+            print(f"{r['sessions']:>8} {r['reruns']:>7} {r['p50']*1000:>9.1f} {r['p95']*1000:>9.1f} {r['state_mb']:>9.2f} {r['mem_mb']:>8.1f} {r['calls']:>7} {r['calls_per_s']:>8.1f}")
+            if args.steps:
+                for k, (p50, p95) in r['by_step'].items():
+                    print(f"{'':>8}   {k:<16} p50 {p50*1000:>8.1f}ms  p95 {p95*1000:>8.1f}ms")
+        print("backend calls:", store.stats())
+
+if __name__ == "__main__":
+    main()